@@ -1,4 +1,7 @@
 # will handle all the game logic
+import json
+import random
+import struct
 
 
 class Move:
@@ -51,6 +54,31 @@ class CastleRights:
         self.bqs = bqs  # black queen side
 
 
+# random numbers for zobrist hashing, one per piece per square
+# fixed seed so keys are the same every run
+_zobrist_rng = random.Random(20240601)
+ZOBRIST_PIECES = {}
+for _color in "wb":
+    for _ptype in "PNBRQK":
+        ZOBRIST_PIECES[_color + _ptype] = [_zobrist_rng.getrandbits(64) for _ in range(64)]
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)  # xored in when black is to move
+ZOBRIST_CASTLE = [_zobrist_rng.getrandbits(64) for _ in range(16)]  # one per set of castling rights
+
+# small ints for each piece, used by the binary snapshot format
+PIECE_CODES = ["--", "wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK"]
+CODE_OF = {piece: i for i, piece in enumerate(PIECE_CODES)}
+
+# snapshot is 64 piece codes, side to move, castling bits, both king squares,
+# then the full zobrist key and the pawn key
+SNAPSHOT_FORMAT = struct.Struct("<64sBBBBQQ")
+SNAPSHOT_SIZE = SNAPSHOT_FORMAT.size
+
+
+def castle_bits(rights):
+    # castling rights packed into 4 bits, wks wqs bks bqs
+    return (rights.wks << 0) | (rights.wqs << 1) | (rights.bks << 2) | (rights.bqs << 3)
+
+
 class GameState:
     def __init__(self):
         # board is 8x8, first character is color white or black, second is piece type
@@ -83,6 +111,170 @@ class GameState:
         self.current_castling_rights = CastleRights(True, True, True, True)
         self.castle_rights_log = [CastleRights(True, True, True, True)]
 
+        # zobrist key of just the pawns, used by the pawn hash table
+        self.pawn_key = self.computePawnKey()
+        # zobrist key of the whole position, with the keys from before each move for undo
+        self.zobrist_key = self.computeZobristKey()
+        self.zobrist_log = []
+
+    def computeZobristKey(self):
+        key = ZOBRIST_CASTLE[castle_bits(self.current_castling_rights)]
+        if not self.white_to_move:
+            key ^= ZOBRIST_SIDE
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        return key
+
+    def computePawnKey(self):
+        # builds the pawn key from scratch, call this after editing board directly
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece[1:] == "P":
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        return key
+
+    def _pawnKeyChange(self, move):
+        # xor of the pawn keys a move adds or removes, same value undoes it
+        change = 0
+        if move.piece_moved[1] == "P":
+            change ^= ZOBRIST_PIECES[move.piece_moved][move.start_row * 8 + move.start_col]
+            if not move.is_pawn_promotion:
+                change ^= ZOBRIST_PIECES[move.piece_moved][move.end_row * 8 + move.end_col]
+        if move.piece_captured[1] == "P":
+            change ^= ZOBRIST_PIECES[move.piece_captured][move.end_row * 8 + move.end_col]
+        return change
+
+    def loadFEN(self, fen):
+        # sets the position from a FEN string, en passant and move clocks are ignored
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError("FEN needs at least a board and side to move: " + fen)
+
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("FEN board must have 8 ranks: " + fen)
+
+        board = []
+        for row in rows:
+            board_row = []
+            for ch in row:
+                if ch.isdigit():
+                    board_row.extend(["--"] * int(ch))
+                elif ch.upper() in PIECE_VALUE:
+                    color = "w" if ch.isupper() else "b"
+                    board_row.append(color + ch.upper())
+                else:
+                    raise ValueError("bad piece in FEN: " + ch)
+            if len(board_row) != 8:
+                raise ValueError("FEN rank must have 8 squares: " + row)
+            board.append(board_row)
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError("FEN side to move must be w or b: " + fields[1])
+
+        white_king = None
+        black_king = None
+        for r in range(8):
+            for c in range(8):
+                if board[r][c] == "wK":
+                    white_king = (r, c)
+                elif board[r][c] == "bK":
+                    black_king = (r, c)
+        if white_king is None or black_king is None:
+            raise ValueError("FEN must have both kings: " + fen)
+
+        castling = fields[2] if len(fields) > 2 else "-"
+        rights = CastleRights("K" in castling, "k" in castling, "Q" in castling, "q" in castling)
+
+        self.board = board
+        self.white_to_move = fields[1] == "w"
+        self.move_log = []
+        self.white_king_location = white_king
+        self.black_king_location = black_king
+        self.checkmate = False
+        self.stalemate = False
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        self.current_castling_rights = rights
+        self.castle_rights_log = [CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs)]
+        self.pawn_key = self.computePawnKey()
+        self.zobrist_key = self.computeZobristKey()
+        self.zobrist_log = []
+
+    def getFEN(self):
+        # en passant is never available here and move clocks arent tracked
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1] if piece[0] == "w" else piece[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        rights = self.current_castling_rights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + \
+                   ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        return "{} {} {} - 0 1".format("/".join(ranks), "w" if self.white_to_move else "b", castling or "-")
+
+    def to_bytes(self):
+        # fixed size snapshot of the position, move history is not included
+        board = bytes([CODE_OF[piece] for row in self.board for piece in row])
+        wk_r, wk_c = self.white_king_location
+        bk_r, bk_c = self.black_king_location
+        return SNAPSHOT_FORMAT.pack(board, self.white_to_move, castle_bits(self.current_castling_rights),
+                                    wk_r * 8 + wk_c, bk_r * 8 + bk_c, self.zobrist_key, self.pawn_key)
+
+    @classmethod
+    def from_bytes(cls, data):
+        board, white_to_move, castling, wk, bk, zobrist_key, pawn_key = SNAPSHOT_FORMAT.unpack(data)
+        gs = cls.__new__(cls)
+        gs.board = [[PIECE_CODES[code] for code in board[r * 8:r * 8 + 8]] for r in range(8)]
+        gs.white_to_move = bool(white_to_move)
+        gs.white_king_location = (wk // 8, wk % 8)
+        gs.black_king_location = (bk // 8, bk % 8)
+        rights = CastleRights(bool(castling & 1), bool(castling & 4), bool(castling & 2), bool(castling & 8))
+        gs._startFrom(rights, zobrist_key, pawn_key)
+        return gs
+
+    def clone(self):
+        # copy of the current position without the move history, so it can't undo past here
+        gs = GameState.__new__(GameState)
+        gs.board = [row[:] for row in self.board]
+        gs.white_to_move = self.white_to_move
+        gs.white_king_location = self.white_king_location
+        gs.black_king_location = self.black_king_location
+        rights = self.current_castling_rights
+        gs._startFrom(CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs), self.zobrist_key, self.pawn_key)
+        return gs
+
+    def _startFrom(self, rights, zobrist_key, pawn_key):
+        # the rest of the state for a position with no move history
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        self.current_castling_rights = rights
+        self.castle_rights_log = [CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs)]
+        self.pawn_key = pawn_key
+        self.zobrist_key = zobrist_key
+        self.zobrist_log = []
+
     def makeMove(self, move):
         self.board[move.start_row][move.start_col] = "--"
         self.board[move.end_row][move.end_col] = move.piece_moved
@@ -101,6 +293,7 @@ class GameState:
                 self.board[move.end_row][move.end_col - 2] = "--"
 
         self.move_log.append(move)
+        self.pawn_key ^= self._pawnKeyChange(move)
 
         # keep track of where kings are
         if move.piece_moved == "wK":
@@ -108,6 +301,7 @@ class GameState:
         elif move.piece_moved == "bK":
             self.black_king_location = (move.end_row, move.end_col)
 
+        old_castle_bits = castle_bits(self.current_castling_rights)
         self.updateCastleRights(move)
         self.castle_rights_log.append(CastleRights(
             self.current_castling_rights.wks,
@@ -116,6 +310,24 @@ class GameState:
             self.current_castling_rights.bqs
         ))
 
+        # update the position key for the squares that changed
+        self.zobrist_log.append(self.zobrist_key)
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        key = self.zobrist_key ^ ZOBRIST_SIDE
+        key ^= ZOBRIST_PIECES[move.piece_moved][start]
+        key ^= ZOBRIST_PIECES[self.board[move.end_row][move.end_col]][end]  # promoted piece if promoting
+        if move.piece_captured != "--":
+            key ^= ZOBRIST_PIECES[move.piece_captured][end]
+        if move.is_castle:
+            rook = ZOBRIST_PIECES[move.piece_moved[0] + "R"]
+            if move.end_col - move.start_col == 2:
+                key ^= rook[end + 1] ^ rook[end - 1]
+            else:
+                key ^= rook[end - 2] ^ rook[end + 1]
+        key ^= ZOBRIST_CASTLE[old_castle_bits] ^ ZOBRIST_CASTLE[castle_bits(self.current_castling_rights)]
+        self.zobrist_key = key
+
         self.white_to_move = not self.white_to_move
 
     def undoMove(self):
@@ -127,6 +339,8 @@ class GameState:
 
         self.board[move.start_row][move.start_col] = move.piece_moved
         self.board[move.end_row][move.end_col] = move.piece_captured
+        self.pawn_key ^= self._pawnKeyChange(move)
+        self.zobrist_key = self.zobrist_log.pop()
 
         # undo the rook move for castling
         if move.is_castle:
@@ -546,9 +760,189 @@ BISHOP_TABLE = [
     [-10,5,0,0,0,0,5,-10],
     [-20,-10,-10,-10,-10,-10,-10,-20]
 ]
+ROOK_TABLE = [
+    [0,0,0,0,0,0,0,0],
+    [5,10,10,10,10,10,10,5],
+    [-5,0,0,0,0,0,0,-5],
+    [-5,0,0,0,0,0,0,-5],
+    [-5,0,0,0,0,0,0,-5],
+    [-5,0,0,0,0,0,0,-5],
+    [-5,0,0,0,0,0,0,-5],
+    [0,0,0,5,5,0,0,0]
+]
+QUEEN_TABLE = [
+    [-20,-10,-10,-5,-5,-10,-10,-20],
+    [-10,0,0,0,0,0,0,-10],
+    [-10,0,5,5,5,5,0,-10],
+    [-5,0,5,5,5,5,0,-5],
+    [0,0,5,5,5,5,0,-5],
+    [-10,5,5,5,5,5,0,-10],
+    [-10,0,5,0,0,0,0,-10],
+    [-20,-10,-10,-5,-5,-10,-10,-20]
+]
+# king wants to hide in the middlegame
+KING_TABLE = [
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-20,-30,-30,-40,-40,-30,-30,-20],
+    [-10,-20,-20,-20,-20,-20,-20,-10],
+    [20,20,0,0,0,0,20,20],
+    [20,30,10,0,0,10,30,20]
+]
+# endgame versions, pawns get pushed and the king comes to the centre
+PAWN_END_TABLE = [
+    [0,0,0,0,0,0,0,0],
+    [80,80,80,80,80,80,80,80],
+    [50,50,50,50,50,50,50,50],
+    [30,30,30,30,30,30,30,30],
+    [20,20,20,20,20,20,20,20],
+    [10,10,10,10,10,10,10,10],
+    [0,0,0,0,0,0,0,0],
+    [0,0,0,0,0,0,0,0]
+]
+KING_END_TABLE = [
+    [-50,-40,-30,-20,-20,-30,-40,-50],
+    [-30,-20,-10,0,0,-10,-20,-30],
+    [-30,-10,20,30,30,20,-10,-30],
+    [-30,-10,30,40,40,30,-10,-30],
+    [-30,-10,30,40,40,30,-10,-30],
+    [-30,-10,20,30,30,20,-10,-30],
+    [-30,-30,0,0,0,0,-30,-30],
+    [-50,-30,-30,-30,-30,-30,-30,-50]
+]
+
+# how much each piece counts towards the game phase, 24 means all pieces still on
+PHASE_WEIGHT = {"K": 0, "Q": 4, "R": 2, "B": 1, "N": 1, "P": 0}
+MAX_PHASE = 24
+
+
+def build_square_tables(tables, values):
+    # turns the 8x8 tables into one flat 64 entry table per piece per color
+    # with material added in and black already mirrored and negated
+    # so evaluation is just one lookup per piece, index is row * 8 + col
+    flat = {}
+    for ptype, table in tables.items():
+        flat["w" + ptype] = [values[ptype] + table[sq // 8][sq % 8] for sq in range(64)]
+        flat["b" + ptype] = [-(values[ptype] + table[7 - sq // 8][sq % 8]) for sq in range(64)]
+    return flat
+
+
+MG_TABLES = build_square_tables({
+    "P": PAWN_TABLE, "N": KNIGHT_TABLE, "B": BISHOP_TABLE,
+    "R": ROOK_TABLE, "Q": QUEEN_TABLE, "K": KING_TABLE,
+}, PIECE_VALUE)
+EG_TABLES = build_square_tables({
+    "P": PAWN_END_TABLE, "N": KNIGHT_TABLE, "B": BISHOP_TABLE,
+    "R": ROOK_TABLE, "Q": QUEEN_TABLE, "K": KING_END_TABLE,
+}, PIECE_VALUE)
+
+
+def load_weights(path):
+    # swaps in piece values and tables written by texel_tuner.py, call it before searching
+    # since scores already in an EngineSession's table were made with the old weights
+    global MG_TABLES, EG_TABLES
+    with open(path) as f:
+        weights = json.load(f)
+    PIECE_VALUE.update(weights["PIECE_VALUE"])
+    MG_TABLES = build_square_tables(weights["MG"], PIECE_VALUE)
+    EG_TABLES = build_square_tables(weights["EG"], PIECE_VALUE)
+
+# pawn structure penalties and bonuses, positive is good for the pawn's owner
+DOUBLED_PAWN = -10
+ISOLATED_PAWN = -15
+BACKWARD_PAWN = -8
+# passed pawn bonus by how many ranks it has moved up from its starting rank
+PASSED_PAWN = [0, 5, 10, 20, 35, 60, 100, 0]
+
+# pawn hash table, pawn key -> pawn structure score
+# pawns barely change during a search so nearly every lookup is a hit
+PAWN_HASH_SIZE = 1 << 16
+pawn_hash = {}
+pawn_hash_probes = 0
+pawn_hash_hits = 0
 
 nodes_evaluated = 0
 
+
+def evaluate_pawns(board):
+    # doubled, isolated, passed and backward pawns, white minus black
+    # files[color][c] is the list of rows with a pawn of that color on file c
+    files = {"w": [[] for _ in range(8)], "b": [[] for _ in range(8)]}
+    for r in range(8):
+        for c in range(8):
+            piece = board[r][c]
+            if piece[1] == "P":
+                files[piece[0]][c].append(r)
+
+    score = 0
+    for color in "wb":
+        own = files[color]
+        enemy = files["b" if color == "w" else "w"]
+        forward = -1 if color == "w" else 1  # row direction the pawns move in
+        sign = 1 if color == "w" else -1
+
+        side_score = 0
+        for c in range(8):
+            if len(own[c]) > 1:
+                side_score += DOUBLED_PAWN * (len(own[c]) - 1)
+
+            neighbours = [f for f in (c - 1, c + 1) if 0 <= f < 8]
+            isolated = not any(own[f] for f in neighbours)
+
+            for r in own[c]:
+                if isolated:
+                    side_score += ISOLATED_PAWN
+
+                # passed if no enemy pawn in front of it on this or the next files
+                passed = True
+                for f in [c] + neighbours:
+                    for er in enemy[f]:
+                        if (er - r) * forward > 0:
+                            passed = False
+                if passed:
+                    advanced = 6 - r if color == "w" else r - 1
+                    side_score += PASSED_PAWN[advanced]
+                    continue
+
+                # backward if no friendly pawn beside or behind it can support it
+                # and the square in front is covered by an enemy pawn
+                if isolated:
+                    continue
+                supported = False
+                for f in neighbours:
+                    for fr in own[f]:
+                        if (fr - r) * forward <= 0:
+                            supported = True
+                if supported:
+                    continue
+                attack_row = r + 2 * forward
+                if 0 <= attack_row < 8:
+                    for f in neighbours:
+                        if attack_row in enemy[f]:
+                            side_score += BACKWARD_PAWN
+                            break
+
+        score += sign * side_score
+    return score
+
+
+def pawn_structure_score(gs):
+    global pawn_hash_probes, pawn_hash_hits
+    pawn_hash_probes += 1
+    score = pawn_hash.get(gs.pawn_key)
+    if score is not None:
+        pawn_hash_hits += 1
+        return score
+
+    score = evaluate_pawns(gs.board)
+    if len(pawn_hash) >= PAWN_HASH_SIZE:
+        pawn_hash.clear()  # crude but cheap, the table refills in a few nodes
+    pawn_hash[gs.pawn_key] = score
+    return score
+
+
 def evaluate_board(gs):
     if gs.checkmate:
         # lose game
@@ -559,47 +953,48 @@ def evaluate_board(gs):
     if gs.stalemate:
         return 0
 
-    score = 0
-    for r in range(8):
-        for c in range(8):
-            piece = gs.board[r][c]
-            if piece == "--":
-                continue
+    # middlegame and endgame scores blended by how much material is left
+    mg = 0
+    eg = 0
+    phase = 0
+    sq = 0
+    for row in gs.board:
+        for piece in row:
+            if piece != "--":
+                mg += MG_TABLES[piece][sq]
+                eg += EG_TABLES[piece][sq]
+                phase += PHASE_WEIGHT[piece[1]]
+            sq += 1
+
+    if phase > MAX_PHASE:
+        phase = MAX_PHASE  # can happen after promotions
+    # int() rounds towards zero so a position and its colour flipped copy get opposite scores,
+    # // would round black's advantages down and favour black
+    score = int((mg * phase + eg * (MAX_PHASE - phase)) / MAX_PHASE)
+
+    score += pawn_structure_score(gs)
+    return score
 
-            color = piece[0]
-            ptype = piece[1]
-            val = PIECE_VALUE[ptype]
-#adding the piece table's eval to the material eval
-            if color== "w":
-                score += val
-            if ptype == "P":
-                score+= PAWN_TABLE[r][c]
-            elif ptype == "N":
-                score+= KNIGHT_TABLE[r][c]
-            elif ptype == "B":
-                score+= BISHOP_TABLE[r][c]
-            
-            else:
-                score -=val
-                if ptype == "P":
-                    score -= PAWN_TABLE[7-r][c]
-                elif ptype == "N":
-                    score -= KNIGHT_TABLE[7-r][c]
-                elif ptype == "B":
-                    score -= BISHOP_TABLE[7-r][c]
 
-    return score
 
 
+# how often (in nodes) minimax asks the stop function whether to give up
+STOP_CHECK_NODES = 512
+
+
+class SearchStopped(Exception):
+    pass
 
 
 # minimax and alpha-beta
 # alpha is best score white can guarantee, beta is best score black can guarantee
 # if beta smaller than alpha we can stop searching that branch
-def minimax(gs, depth, alpha, beta, maximizing):
+def minimax(gs, depth, alpha, beta, maximizing, stop=None):
     # hit the depth limit or game ended
     global nodes_evaluated 
     nodes_evaluated += 1 
+    if stop is not None and nodes_evaluated % STOP_CHECK_NODES == 0 and stop():
+        raise SearchStopped()
     if depth == 0 or gs.checkmate or gs.stalemate:
         return evaluate_board(gs)
 
@@ -609,7 +1004,7 @@ def minimax(gs, depth, alpha, beta, maximizing):
         best = -999999
         for move in moves:
             gs.makeMove(move)
-            score = minimax(gs, depth - 1, alpha, beta, False)
+            score = minimax(gs, depth - 1, alpha, beta, False, stop)
             gs.undoMove()
 
             if score > best:
@@ -624,7 +1019,7 @@ def minimax(gs, depth, alpha, beta, maximizing):
         best = 999999
         for move in moves:
             gs.makeMove(move)
-            score = minimax(gs, depth - 1, alpha, beta, True)
+            score = minimax(gs, depth - 1, alpha, beta, True, stop)
             gs.undoMove()
 
             if score < best:
@@ -636,20 +1031,40 @@ def minimax(gs, depth, alpha, beta, maximizing):
         return best
 
 
-def choose_best_move(gs, depth):
+# stop is an optional function checked before each root move and every STOP_CHECK_NODES
+# nodes inside minimax, if it returns True the search gives up early and returns the best
+# move found so far (the first legal move if no root move was finished)
+def choose_best_move(gs, depth, stop=None):
 
     moves = gs.getValidMoves()
     if not moves:
         return None
 
+    log_length = len(gs.move_log)
+    try:
+        best_move = _search_root(gs, depth, moves, stop)
+    except SearchStopped as e:
+        best_move = e.args[0]
+        # the exception skipped the undos on the way out
+        while len(gs.move_log) > log_length:
+            gs.undoMove()
+
+    if best_move is None:
+        best_move = moves[0]
+    return best_move
+
+
+def _search_root(gs, depth, moves, stop):
     best_move = None
 
     if gs.white_to_move:
         best_score = -999999
         for move in moves:
+            if stop is not None and best_move is not None and stop():
+                break
             gs.makeMove(move)
             # start with worst possibility alpha/beta so nothing gets pruned at the root
-            score = minimax(gs, depth - 1, -999999, 999999, False)
+            score = _root_minimax(gs, depth - 1, False, stop, best_move)
             gs.undoMove()
             if score > best_score:
                 best_score = score
@@ -657,11 +1072,209 @@ def choose_best_move(gs, depth):
     else:
         best_score = 999999
         for move in moves:
+            if stop is not None and best_move is not None and stop():
+                break
             gs.makeMove(move)
-            score = minimax(gs, depth - 1, -999999, 999999, True)
+            score = _root_minimax(gs, depth - 1, True, stop, best_move)
             gs.undoMove()
             if score < best_score:
                 best_score = score
                 best_move = move
 
-    return best_move
\ No newline at end of file
+    return best_move
+
+
+def _root_minimax(gs, depth, maximizing, stop, best_move):
+    # hands the best root move so far to choose_best_move along with the stop
+    try:
+        return minimax(gs, depth, -999999, 999999, maximizing, stop)
+    except SearchStopped:
+        raise SearchStopped(best_move)
+
+# transposition table flags, scores are from white's side like everywhere else
+TT_EXACT = 0
+TT_LOWER = 1   # real score is at least this
+TT_UPPER = 2   # real score is at most this
+TT_SIZE = 1 << 18
+TT_MAX_AGE = 2  # an entry not used for this many searches can be thrown away
+
+
+class EngineSession:
+    # long lived engine for one game, keeps what it learned between moves
+    # transposition table and history scores carry over, and the principal variation
+    # from the last search is remembered so if the game follows it the next search
+    # starts from the depth it already reached there
+    def __init__(self, gs=None, tt_size=TT_SIZE):
+        self.gs = gs if gs is not None else GameState()
+        self.tt_size = tt_size
+        self.tt = {}          # zobrist key -> [depth, score, flag, best move id, age]
+        self.history = {}     # (piece, end square) -> score for quiet moves that caused cutoffs
+        self.predicted = {}   # zobrist key of a position on the last pv -> rest of the pv from there
+        self.pv_hint = []     # move ids expected at each ply of the current search
+        self.pv = []          # principal variation from the last search
+        self.age = 0
+        self.nodes = 0
+
+    def choose_move(self, depth, stop=None):
+        # same idea as choose_best_move but iterative deepening over the kept tables
+        # stop works the same, it is checked before each root move of the deepest iteration
+        gs = self.gs
+        self.age += 1
+        self.nodes = 0
+        for key in self.history:
+            self.history[key] //= 2  # old history counts for less
+        if len(self.tt) >= self.tt_size:
+            self._evict()
+
+        self.pv_hint = self.predicted.get(gs.zobrist_key, [])
+        start_depth = 1
+        entry = self.tt.get(gs.zobrist_key)
+        if entry is not None and entry[2] == TT_EXACT:
+            start_depth = min(entry[0] + 1, depth)  # already searched this deep last move
+
+        best_move = None
+        for d in range(start_depth, depth + 1):
+            self._search(d, -1000000, 1000000, 0, stop if d == depth else None)
+            move = self._ttMove(gs)
+            if move is not None:
+                best_move = move
+
+        if best_move is None:
+            moves = gs.getValidMoves()
+            return moves[0] if moves else None
+
+        self.pv = self._principalVariation(depth)
+        self._rememberPrediction()
+        return best_move
+
+    def _search(self, depth, alpha, beta, ply, stop=None):
+        gs = self.gs
+        self.nodes += 1
+        key = gs.zobrist_key
+
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            entry[4] = self.age
+            tt_move = entry[3]
+            if ply > 0 and entry[0] >= depth:
+                score = entry[1]
+                if entry[2] == TT_EXACT:
+                    return score
+                if entry[2] == TT_LOWER and score >= beta:
+                    return score
+                if entry[2] == TT_UPPER and score <= alpha:
+                    return score
+
+        if depth == 0 or gs.checkmate or gs.stalemate:
+            return evaluate_board(gs)
+
+        moves = gs.getValidMoves()
+        if not moves:
+            return evaluate_board(gs)  # getValidMoves has set checkmate or stalemate
+        self._orderMoves(moves, tt_move, ply)
+
+        white = gs.white_to_move
+        alpha_start = alpha
+        beta_start = beta
+        best = None
+        best_move = None
+        stopped = False
+        for move in moves:
+            if stop is not None and best_move is not None and stop():
+                stopped = True
+                break
+            gs.makeMove(move)
+            score = self._search(depth - 1, alpha, beta, ply + 1)
+            gs.undoMove()
+
+            if best is None or (score > best if white else score < best):
+                best = score
+                best_move = move
+            if white and best > alpha:
+                alpha = best
+            elif not white and best < beta:
+                beta = best
+            if beta <= alpha:
+                if move.piece_captured == "--":
+                    hist_key = (move.piece_moved, move.end_row * 8 + move.end_col)
+                    self.history[hist_key] = self.history.get(hist_key, 0) + depth * depth
+                break
+
+        if stopped:
+            # only some moves were searched so the real score could still be better for the side to move
+            flag = TT_LOWER if white else TT_UPPER
+        elif best <= alpha_start:
+            flag = TT_UPPER
+        elif best >= beta_start:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        if len(self.tt) >= self.tt_size:
+            self._evict()
+        self.tt[key] = [depth, best, flag, best_move.move_id, self.age]
+        return best
+
+    def _orderMoves(self, moves, tt_move, ply):
+        # best move from the table, then the expected pv move, then captures by
+        # most valuable victim least valuable attacker, then quiet moves by history
+        pv_move = self.pv_hint[ply] if ply < len(self.pv_hint) else None
+
+        def order(move):
+            if move.move_id == tt_move:
+                return 3000000
+            if move.move_id == pv_move:
+                return 2000000
+            if move.piece_captured != "--":
+                return 1000000 + 10 * PIECE_VALUE[move.piece_captured[1]] - PIECE_VALUE[move.piece_moved[1]]
+            return self.history.get((move.piece_moved, move.end_row * 8 + move.end_col), 0)
+
+        moves.sort(key=order, reverse=True)
+
+    def _ttMove(self, gs):
+        # the stored best move for this position, if it is still legal here
+        entry = self.tt.get(gs.zobrist_key)
+        if entry is None:
+            return None
+        for move in gs.getValidMoves():
+            if move.move_id == entry[3]:
+                return move
+        return None
+
+    def _principalVariation(self, max_len):
+        # follows the table's best moves from the current position
+        gs = self.gs
+        pv = []
+        seen = set()
+        while len(pv) < max_len and gs.zobrist_key not in seen:
+            seen.add(gs.zobrist_key)
+            move = self._ttMove(gs)
+            if move is None:
+                break
+            pv.append(move)
+            gs.makeMove(move)
+        for _ in pv:
+            gs.undoMove()
+        return pv
+
+    def _rememberPrediction(self):
+        # store the rest of the pv for every position along it, so whichever side
+        # searches next can pick up the line if the game goes that way
+        gs = self.gs
+        self.predicted = {}
+        ids = [move.move_id for move in self.pv]
+        for i, move in enumerate(self.pv):
+            gs.makeMove(move)
+            self.predicted[gs.zobrist_key] = ids[i + 1:]
+        for _ in self.pv:
+            gs.undoMove()
+
+    def _evict(self):
+        # drop entries no search has used for a while, and if that isnt enough
+        # keep only the deeper entries from the current search
+        oldest = self.age - TT_MAX_AGE
+        self.tt = {key: e for key, e in self.tt.items() if e[4] > oldest}
+        if len(self.tt) >= self.tt_size * 3 // 4:
+            self.tt = {key: e for key, e in self.tt.items() if e[4] == self.age and e[0] > 1}
+        if len(self.tt) >= self.tt_size * 3 // 4:
+            self.tt = {}
@@ -0,0 +1,146 @@
+# Small client for analysis_server.py
+# run on its own it starts a server on loopback, sends a few requests and prints the replies
+
+import argparse
+import asyncio
+import json
+import time
+
+import analysis_server
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+ENDGAME_FEN = "8/8/4k3/8/2R5/8/4K3/8 w - - 0 1"
+
+
+class AnalysisClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host=analysis_server.DEFAULT_HOST, port=analysis_server.DEFAULT_PORT, unix_path=None):
+        if unix_path is not None:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def send(self, msg):
+        self.writer.write((json.dumps(msg) + "\n").encode())
+        await self.writer.drain()
+
+    async def analyse(self, req_id, fen, depth=None, movetime=None):
+        msg = {"id": req_id, "cmd": "analyse", "fen": fen}
+        if depth is not None:
+            msg["depth"] = depth
+        if movetime is not None:
+            msg["movetime"] = movetime
+        await self.send(msg)
+
+    async def cancel(self, req_id):
+        await self.send({"id": req_id, "cmd": "cancel"})
+
+    async def replies(self):
+        # yields each reply until the server closes the connection
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            yield json.loads(line)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def loopback_demo(workers=2):
+    # server and client in the same event loop, port 0 picks any free port
+    server = analysis_server.AnalysisServer(workers=workers)
+    srv = await server.start("127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+
+    client = await AnalysisClient.connect("127.0.0.1", port)
+    await client.analyse("start", START_FEN, depth=3)
+    await client.analyse("endgame", ENDGAME_FEN, movetime=1500)
+    await client.analyse("cancel-me", START_FEN, depth=4)
+    await client.analyse("bad", "not a fen", depth=2)
+    await client.analyse("zero-time", START_FEN, movetime=0)
+    await client.analyse("bool-depth", START_FEN, depth=True)
+    await client.cancel("cancel-me")
+
+    results = await collect(client, {"start", "endgame", "cancel-me", "bad", "zero-time", "bool-depth"})
+    await client.close()
+    await server.close()
+
+    # one worker and one queue slot, so "full" waits for a slot behind "busy" and "held" behind
+    # that. the cancels still have to be read and answered straight away
+    server = analysis_server.AnalysisServer(workers=1, max_pending=1)
+    srv = await server.start("127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+    client = await AnalysisClient.connect("127.0.0.1", port)
+    start = time.time()
+    await client.analyse("busy", START_FEN, movetime=4000)
+    await client.analyse("full", START_FEN, depth=2)
+    await client.analyse("held", START_FEN, depth=2)
+    await client.cancel("busy")
+    await client.cancel("full")
+    await client.cancel("held")
+    results.update(await collect(client, {"busy", "full", "held"}))
+    results["cancel_time"] = time.time() - start
+    await client.close()
+    await server.close()
+    return results
+
+
+async def collect(client, waiting):
+    # every accepted request ends with exactly one bestmove, cancelled or error line
+    results = {}
+    async for reply in client.replies():
+        print(reply)
+        if reply["type"] in ("bestmove", "cancelled", "error"):
+            results[reply["id"]] = reply
+            waiting.discard(reply["id"])
+        if not waiting:
+            break
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="client for the chess analysis server")
+    parser.add_argument("--host", default=analysis_server.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=None, help="connect to a running server instead of the loopback demo")
+    parser.add_argument("--unix", default=None)
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--movetime", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.port is None and args.unix is None:
+        results = asyncio.run(loopback_demo())
+        assert results["start"]["type"] == "bestmove"
+        assert results["endgame"]["type"] == "bestmove"
+        assert results["cancel-me"]["type"] == "cancelled"
+        assert results["bad"]["type"] == "error"
+        assert results["zero-time"]["type"] == "error"
+        assert results["bool-depth"]["type"] == "error"
+        for req_id in ("busy", "full", "held"):
+            assert results[req_id]["type"] == "cancelled"
+        assert results["cancel_time"] < 4
+        print("loopback ok")
+        return
+
+    async def run_one():
+        client = await AnalysisClient.connect(args.host, args.port, args.unix)
+        depth = args.depth if args.depth is not None or args.movetime is not None else 3
+        await client.analyse("1", args.fen, depth=depth, movetime=args.movetime)
+        async for reply in client.replies():
+            print(reply)
+            if reply["type"] in ("bestmove", "cancelled", "error"):
+                break
+        await client.close()
+
+    asyncio.run(run_one())
+
+
+if __name__ == "__main__":
+    main()
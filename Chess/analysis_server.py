@@ -0,0 +1,353 @@
+# Local analysis server so other tools can ask the engine about positions
+# talks JSON lines over a TCP or unix socket, searches run on a pool of worker processes
+#
+# requests (one JSON object per line):
+#   {"id": "a1", "cmd": "analyse", "fen": "<fen>", "depth": 3}
+#   {"id": "a2", "cmd": "analyse", "fen": "<fen>", "movetime": 2000}   (milliseconds)
+#   {"id": "a1", "cmd": "cancel"}
+# replies:
+#   {"id": "a1", "type": "queued"}
+#   {"id": "a1", "type": "info", "depth": 2, "move": "e2e4", "nodes": 812, "time_ms": 90, "nps": 9022}
+#   {"id": "a1", "type": "bestmove", "move": "e2e4", "depth": 3}
+#   {"id": "a1", "type": "cancelled"}
+#   {"id": "a1", "type": "error", "message": "..."}
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ChessEngine
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+MAX_PENDING = 32      # requests queued for the workers across all clients
+MAX_BACKLOG = 64      # requests one client can have waiting for a queue slot before new ones are refused
+MAX_DEPTH = 6         # depth cap for searches only limited by movetime
+
+
+def analyse_position(job_key, fen, depth, movetime, info_queue, cancel_event):
+    # runs inside a worker process
+    # iterative deepening so a movetime search always has a finished depth to report
+    gs = ChessEngine.GameState()
+    gs.loadFEN(fen)
+
+    start = time.time()
+    deadline = None
+    if movetime is not None:
+        deadline = start + movetime / 1000
+    max_depth = depth if depth is not None else MAX_DEPTH
+
+    stopped = [False]
+
+    def stop():
+        if cancel_event.is_set() or (deadline is not None and time.time() >= deadline):
+            stopped[0] = True
+        return stopped[0]
+
+    best = None
+    best_depth = 0
+    for d in range(1, max_depth + 1):
+        ChessEngine.nodes_evaluated = 0
+        depth_start = time.time()
+        move = ChessEngine.choose_best_move(gs, d, stop)
+        if move is None:
+            break  # checkmate or stalemate, nothing to search
+
+        # a depth cut short by stop() is only used if we have nothing better
+        if stopped[0] and best is not None:
+            break
+        best = move.getChessNotation()
+        best_depth = d
+
+        elapsed = time.time() - depth_start
+        info_queue.put({
+            "key": job_key,
+            "type": "info",
+            "depth": d,
+            "move": best,
+            "nodes": ChessEngine.nodes_evaluated,
+            "time_ms": int((time.time() - start) * 1000),
+            "nps": int(ChessEngine.nodes_evaluated / elapsed) if elapsed > 0 else 0,
+        })
+        if stopped[0] or stop():
+            break
+
+    return {"move": best, "depth": best_depth, "cancelled": cancel_event.is_set()}
+
+
+class Job:
+    def __init__(self, key, client_id, conn, fen, depth, movetime, cancel_event):
+        self.key = key
+        self.client_id = client_id
+        self.conn = conn
+        self.fen = fen
+        self.depth = depth
+        self.movetime = movetime
+        self.cancel_event = cancel_event
+        self.cancelled = False
+        self.state = "waiting"  # waiting for a queue slot, then "queued", then "running"
+
+
+class Connection:
+    def __init__(self, writer):
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.jobs = {}  # client id -> Job
+        self.backlog = asyncio.Queue()  # analyse requests waiting for a queue slot
+        self.closed = False
+
+    async def send(self, msg):
+        if self.closed:
+            return
+        async with self.lock:
+            try:
+                self.writer.write((json.dumps(msg) + "\n").encode())
+                # waits here if the client is slow to read, which slows the workers reporting to it
+                await self.writer.drain()
+            except ConnectionError:
+                self.closed = True
+
+
+class AnalysisServer:
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.jobs = {}  # job key -> Job
+        self.next_key = 0
+        self.pool = None
+        self.manager = None
+        self.info_queue = None
+        self.pending = None
+        self.slots = None
+        self.tasks = []
+        self.clients = {}  # handler task -> Connection
+        self.server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        self.manager = multiprocessing.Manager()
+        self.info_queue = self.manager.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # the queue itself is unbounded, a job has to take one of the slots to go in
+        self.pending = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.max_pending)
+
+        # one dispatcher per worker so the pool never has a backlog we cant cancel
+        for _ in range(self.workers):
+            self.tasks.append(asyncio.create_task(self._dispatch()))
+        self.tasks.append(asyncio.create_task(self._pump_info()))
+
+        if unix_path is not None:
+            self.server = await asyncio.start_unix_server(self._handle_client, path=unix_path)
+        else:
+            self.server = await asyncio.start_server(self._handle_client, host, port)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        # closing the sockets ends each client handler at its next read
+        for conn in self.clients.values():
+            conn.closed = True
+            conn.writer.close()
+        await asyncio.gather(*self.clients, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        for job in list(self.jobs.values()):
+            self._cancel(job)
+        self.info_queue.put(None)  # lets the pump thread finish its blocking get
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.pool.shutdown(wait=True)
+        self.manager.shutdown()
+
+    def _cancel(self, job):
+        job.cancelled = True
+        job.cancel_event.set()
+        if job.state == "queued":
+            self.slots.release()  # give the slot up now rather than when a worker gets to it
+            job.state = "waiting"
+
+    def _finish(self, job):
+        self.jobs.pop(job.key, None)
+        if job.conn.jobs.get(job.client_id) is job:
+            del job.conn.jobs[job.client_id]
+
+    async def _handle_client(self, reader, writer):
+        conn = Connection(writer)
+        task = asyncio.current_task()
+        self.clients[task] = conn
+        feeder = asyncio.create_task(self._feed(conn))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    await conn.send({"type": "error", "message": "invalid JSON"})
+                    continue
+                if not isinstance(msg, dict):
+                    await conn.send({"type": "error", "message": "request must be a JSON object"})
+                    continue
+                await self._handle_request(conn, msg)
+        except ConnectionError:
+            pass
+        finally:
+            conn.closed = True
+            for job in list(conn.jobs.values()):
+                self._cancel(job)
+                if job.state != "running":
+                    self._finish(job)
+            feeder.cancel()
+            writer.close()
+            del self.clients[task]
+
+    async def _handle_request(self, conn, msg):
+        client_id = msg.get("id")
+        cmd = msg.get("cmd")
+        if not isinstance(client_id, (str, int)):
+            await conn.send({"id": None, "type": "error", "message": "id must be a string or int"})
+            return
+
+        if cmd == "cancel":
+            job = conn.jobs.get(client_id)
+            if job is None:
+                await conn.send({"id": client_id, "type": "error", "message": "unknown id"})
+            else:
+                self._cancel(job)
+                if job.state != "running":
+                    # never reached a worker so nothing else will answer for it
+                    await conn.send({"id": client_id, "type": "cancelled"})
+                    self._finish(job)
+            return
+
+        if cmd != "analyse":
+            await conn.send({"id": client_id, "type": "error", "message": "unknown cmd: {}".format(cmd)})
+            return
+
+        if client_id in conn.jobs:
+            await conn.send({"id": client_id, "type": "error", "message": "id already in use"})
+            return
+        if conn.backlog.qsize() >= MAX_BACKLOG:
+            await conn.send({"id": client_id, "type": "error", "message": "too many requests waiting"})
+            return
+
+        fen = msg.get("fen")
+        depth = msg.get("depth")
+        movetime = msg.get("movetime")
+        if depth is None and movetime is None:
+            await conn.send({"id": client_id, "type": "error", "message": "need a depth or movetime"})
+            return
+        # bool is a subclass of int so true/false have to be turned away on purpose
+        if depth is not None and (isinstance(depth, bool) or not isinstance(depth, int)
+                                  or not 1 <= depth <= MAX_DEPTH):
+            await conn.send({"id": client_id, "type": "error", "message": "depth must be 1-{}".format(MAX_DEPTH)})
+            return
+        if movetime is not None and (isinstance(movetime, bool) or not isinstance(movetime, (int, float))
+                                     or not 0 < movetime < float("inf")):
+            await conn.send({"id": client_id, "type": "error", "message": "movetime must be a positive number"})
+            return
+        try:
+            ChessEngine.GameState().loadFEN(fen)
+        except (ValueError, AttributeError) as e:
+            await conn.send({"id": client_id, "type": "error", "message": "bad fen: {}".format(e)})
+            return
+
+        self.next_key += 1
+        job = Job(self.next_key, client_id, conn, fen, depth, movetime, self.manager.Event())
+        self.jobs[job.key] = job
+        conn.jobs[client_id] = job
+
+        await conn.send({"id": client_id, "type": "queued"})
+        # the client keeps being read while this waits for a slot, so cancels still get through
+        conn.backlog.put_nowait(job)
+
+    async def _feed(self, conn):
+        # moves one client's requests into the shared queue in order as slots free up
+        while True:
+            job = await conn.backlog.get()
+            if job.cancelled:
+                continue
+            await self.slots.acquire()
+            if job.cancelled:
+                self.slots.release()
+                continue
+            job.state = "queued"
+            self.pending.put_nowait(job)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.pending.get()
+            if job.cancelled:
+                self._finish(job)  # already answered and its slot given back
+                continue
+            self.slots.release()
+            job.state = "running"
+            try:
+                try:
+                    result = await loop.run_in_executor(
+                        self.pool, analyse_position, job.key, job.fen, job.depth,
+                        job.movetime, self.info_queue, job.cancel_event)
+                except Exception as e:
+                    await job.conn.send({"id": job.client_id, "type": "error", "message": str(e)})
+                    continue
+
+                if job.cancelled:
+                    await job.conn.send({"id": job.client_id, "type": "cancelled"})
+                else:
+                    await job.conn.send({"id": job.client_id, "type": "bestmove",
+                                         "move": result["move"], "depth": result["depth"]})
+            finally:
+                self._finish(job)
+
+    async def _pump_info(self):
+        # forwards progress lines from the workers to whichever client asked
+        loop = asyncio.get_running_loop()
+        while True:
+            msg = await loop.run_in_executor(None, self.info_queue.get)
+            if msg is None:
+                return
+            job = self.jobs.get(msg.pop("key"))
+            if job is None or job.cancelled:
+                continue
+            msg["id"] = job.client_id
+            await job.conn.send(msg)
+
+
+async def serve(host, port, unix_path, workers):
+    server = AnalysisServer(workers=workers)
+    srv = await server.start(host, port, unix_path)
+    where = unix_path if unix_path else "{}:{}".format(host, port)
+    print("analysis server listening on", where)
+    try:
+        await srv.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON lines chess analysis server")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="listen on a unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# Search benchmark on a fixed set of positions so speed regressions get noticed
+#   python bench.py run --out bench.json                 run and save the results
+#   python bench.py compare baseline.json bench.json     flag positions that got slower
+#   python bench.py run --baseline baseline.json         both in one go
+#   python bench.py mate                                 mate search on known mate in N positions
+# compare exits with 1 if any position is slower than the threshold allows,
+# and with 2 if the two runs used different searches or have no positions in common
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import ChessEngine
+import mate_search
+
+# name, fen, depth
+POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 3),
+    ("italian", "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4", 3),
+    ("queens_gambit", "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4", 3),
+    ("middlegame_black", "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 b - - 0 10", 3),
+    ("rook_endgame", "8/5pk1/6p1/8/3R4/6P1/5PK1/3r4 w - - 0 40", 4),
+    ("pawn_endgame", "8/8/3k4/3p4/3P4/3K4/8/8 w - - 0 50", 5),
+    ("kqk", "8/8/8/4k3/8/8/8/4K2Q w - - 0 60", 4),
+    ("back_rank_mate", "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1", 4),
+    ("knight_fork", "r3k3/8/8/1N6/8/8/8/4K3 w - - 0 1", 4),
+    ("hanging_queen", "rnb1kbnr/pppp1ppp/8/4p1q1/4P3/3P4/PPP2PPP/RNBQKBNR w KQkq - 1 3", 3),
+]
+
+# name, fen, moves to mate
+MATE_POSITIONS = [
+    ("back_rank", "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1", 1),
+    ("scholars", "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4", 1),
+    ("kqk_corner", "k7/8/2K5/8/8/8/8/7Q w - - 0 1", 2),
+    ("two_rooks", "7k/8/8/8/8/8/R7/1R4K1 w - - 0 1", 2),
+    ("rook_roller", "8/R7/K7/8/8/7k/8/4R3 w - - 0 1", 3),
+    ("queen_vs_pawn", "8/8/8/8/8/5Q2/4Kp2/6k1 w - - 0 1", 3),
+    ("rook_bishop", "8/4B3/8/2R5/8/8/k7/4K3 w - - 0 1", 4),
+    ("queen_rook_ladder", "8/8/8/4k3/8/8/8/QR4K1 w - - 0 1", 4),
+]
+# only with --long, takes about 350000 nodes
+LONG_MATE_POSITIONS = [
+    ("queen_rook_centre", "8/8/8/8/4k3/8/8/QR4K1 w - - 0 1", 5),
+]
+MATE_BENCH_NODES = 500000
+
+DEFAULT_THRESHOLD = 0.10  # 10% slower than the baseline counts as a regression
+
+
+def search_once(fen, depth, search):
+    # one fresh search, the pawn hash is cleared so every run starts the same
+    gs = ChessEngine.GameState()
+    gs.loadFEN(fen)
+    ChessEngine.pawn_hash.clear()
+    ChessEngine.pawn_hash_probes = 0
+    ChessEngine.pawn_hash_hits = 0
+    ChessEngine.nodes_evaluated = 0
+
+    start = time.perf_counter()
+    if search == "session":
+        session = ChessEngine.EngineSession(gs)
+        move = session.choose_move(depth)
+        nodes = session.nodes
+    else:
+        move = ChessEngine.choose_best_move(gs, depth)
+        nodes = ChessEngine.nodes_evaluated
+    elapsed = time.perf_counter() - start
+    probes = ChessEngine.pawn_hash_probes
+    pawn_hits = ChessEngine.pawn_hash_hits / probes if probes else 0.0
+    return move, nodes, elapsed, pawn_hits
+
+
+def bench_position(name, fen, depth, search, repeat, memory):
+    # best of repeat runs for the time, then one more under tracemalloc for memory
+    # since tracing slows the search down too much to time it at the same time
+    times = []
+    for _ in range(repeat):
+        move, nodes, elapsed, pawn_hits = search_once(fen, depth, search)
+        times.append(elapsed)
+    best_time = min(times)
+
+    peak_kb = None
+    if memory:
+        tracemalloc.start()
+        search_once(fen, depth, search)
+        peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+
+    return {
+        "name": name,
+        "fen": fen,
+        "depth": depth,
+        "nodes": nodes,
+        "time_s": round(best_time, 4),
+        "nps": int(nodes / best_time) if best_time > 0 else 0,
+        "best_move": move.getChessNotation() if move is not None else None,
+        "pawn_hash_hits": round(pawn_hits, 3),
+        "peak_kb": peak_kb,
+    }
+
+
+def run(search="minimax", repeat=3, memory=True, names=None):
+    results = []
+    for name, fen, depth in POSITIONS:
+        if names and name not in names:
+            continue
+        result = bench_position(name, fen, depth, search, repeat, memory)
+        print("{:<18} d{} {:>9} nodes {:>8.3f}s {:>8} nps {:>5.0%} pawn hash hits  {}  {}".format(
+            name, depth, result["nodes"], result["time_s"], result["nps"], result["pawn_hash_hits"], result["best_move"],
+            "" if result["peak_kb"] is None else "{} KB".format(result["peak_kb"])))
+        results.append(result)
+
+    total_nodes = sum(r["nodes"] for r in results)
+    total_time = sum(r["time_s"] for r in results)
+    return {
+        "search": search,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "positions": results,
+        "total": {
+            "nodes": total_nodes,
+            "time_s": round(total_time, 4),
+            "nps": int(total_nodes / total_time) if total_time > 0 else 0,
+        },
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    # returns the names of positions that got slower by more than threshold
+    # raises ValueError if the two runs used different searches, their times mean nothing side by side,
+    # or if they have no positions in common
+    if baseline["search"] != current["search"]:
+        raise ValueError("baseline used the {} search but this run used {}".format(
+            baseline["search"], current["search"]))
+
+    old = {r["name"]: r for r in baseline["positions"]}
+    slower = []
+    b_total = 0.0
+    c_total = 0.0
+    compared = 0
+    for r in current["positions"]:
+        b = old.get(r["name"])
+        if b is None:
+            print("{:<18} not in baseline".format(r["name"]))
+            continue
+        if b["depth"] != r["depth"]:
+            print("{:<18} depth changed {} -> {}, skipped".format(r["name"], b["depth"], r["depth"]))
+            continue
+
+        compared += 1
+        b_total += b["time_s"]
+        c_total += r["time_s"]
+        change = r["time_s"] / b["time_s"] - 1 if b["time_s"] > 0 else 0.0
+        notes = []
+        if change > threshold:
+            notes.append("SLOWER")
+            slower.append(r["name"])
+        if r["nodes"] != b["nodes"]:
+            notes.append("nodes {} -> {}".format(b["nodes"], r["nodes"]))
+        if r["best_move"] != b["best_move"]:
+            notes.append("move {} -> {}".format(b["best_move"], r["best_move"]))
+        print("{:<18} {:>8.3f}s -> {:>8.3f}s {:>+7.1%}  {}".format(
+            r["name"], b["time_s"], r["time_s"], change, " ".join(notes)))
+
+    names = {r["name"] for r in current["positions"]}
+    for b in baseline["positions"]:
+        if b["name"] not in names:
+            print("{:<18} missing from this run".format(b["name"]))
+    if compared == 0:
+        raise ValueError("no positions in common with the baseline")
+
+    # only positions in both runs count towards the total
+    if b_total > 0:
+        print("{:<18} {:>8.3f}s -> {:>8.3f}s {:>+7.1%}".format("total", b_total, c_total, c_total / b_total - 1))
+    return slower
+
+
+def run_mates(max_nodes=MATE_BENCH_NODES, time_limit=None, long=False):
+    results = []
+    positions = MATE_POSITIONS + LONG_MATE_POSITIONS if long else MATE_POSITIONS
+    for name, fen, mate_in in positions:
+        gs = ChessEngine.GameState()
+        gs.loadFEN(fen)
+        search = mate_search.MateSearch(max_nodes, time_limit)
+        start = time.perf_counter()
+        line = search.find_mate(gs, mate_in)
+        elapsed = time.perf_counter() - start
+
+        result = {
+            "name": name,
+            "fen": fen,
+            "expected": mate_in,
+            "found": search.mate_in,
+            "status": search.status,
+            "nodes": search.nodes,
+            "time_s": round(elapsed, 4),
+            "table_entries": len(search.table),
+            "line": [m.getChessNotation() for m in line] if line else None,
+        }
+        print("{:<18} mate in {} {:<10} found {:<4} {:>8} nodes {:>8.3f}s  {}".format(
+            name, mate_in, search.status, str(search.mate_in), search.nodes, elapsed,
+            " ".join(result["line"] or [])))
+        results.append(result)
+    return results
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fixed position search benchmark")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    run_p = sub.add_parser("run", help="run the benchmark positions")
+    run_p.add_argument("--out", default=None, help="write the results as JSON here")
+    run_p.add_argument("--search", choices=("minimax", "session"), default="minimax")
+    run_p.add_argument("--repeat", type=int, default=3, help="runs per position, the fastest is kept")
+    run_p.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    run_p.add_argument("--only", nargs="*", help="just these position names")
+    run_p.add_argument("--baseline", default=None, help="compare against this results file afterwards")
+    run_p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    cmp_p = sub.add_parser("compare", help="compare two results files")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    mate_p = sub.add_parser("mate", help="mate search on known mate in N positions")
+    mate_p.add_argument("--max-nodes", type=int, default=MATE_BENCH_NODES)
+    mate_p.add_argument("--time-limit", type=float, default=None, help="seconds per position")
+    mate_p.add_argument("--long", action="store_true", help="include the slow mate in 5")
+    mate_p.add_argument("--out", default=None)
+
+    args = parser.parse_args()
+
+    if args.cmd == "mate":
+        results = run_mates(args.max_nodes, args.time_limit, args.long)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=1)
+        wrong = [r["name"] for r in results if r["found"] != r["expected"]]
+        if wrong:
+            print("mate not found in the expected number of moves:", ", ".join(wrong))
+            return 1
+        return 0
+
+    if args.cmd == "run":
+        results = run(args.search, args.repeat, not args.no_memory, args.only)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=1)
+            print("written to", args.out)
+        if args.baseline is None:
+            return 0
+        baseline = load(args.baseline)
+    else:
+        baseline = load(args.baseline)
+        results = load(args.current)
+
+    try:
+        slower = compare(baseline, results, args.threshold)
+    except ValueError as e:
+        print("can't compare:", e)
+        return 2
+    if slower:
+        print("{} position(s) slower than {:.0%}: {}".format(len(slower), args.threshold, ", ".join(slower)))
+        return 1
+    print("no regressions over {:.0%}".format(args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
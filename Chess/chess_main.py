@@ -73,6 +73,8 @@ def main():
 
     images = load_images()
     gs = ChessEngine.GameState()
+    # keeps the engine's tables between AI moves so later moves are quicker
+    session = ChessEngine.EngineSession(gs)
     legal_moves = gs.getValidMoves()
 
     selected = None  # the square the player clicked first
@@ -112,7 +114,7 @@ def main():
 
                 # press A to make an AI move
                 if event.key == pg.K_a:
-                    best = ChessEngine.choose_best_move(gs, depth=3)
+                    best = session.choose_move(depth=3)
                     if best is not None:
                         gs.makeMove(best)
                         move_made = True
@@ -0,0 +1,243 @@
+# Mate finder using depth-first proof-number search (df-pn)
+# much cheaper than minimax for proving forced mates since it only cares whether each
+# position is a proven mate or not, and keeps digging where the proof looks closest
+#
+# the side to move is the attacker. attacker to move is an OR node (one mating move is
+# enough), defender to move is an AND node (every reply has to be mated). the search is
+# repeated for mate in 1, 2, 3... so the first proof found is the shortest one.
+
+import time
+
+import ChessEngine
+
+INF = 10 ** 9
+DEFAULT_MAX_NODES = 200000
+DEFAULT_MAX_ENTRIES = 1000000   # about 100 bytes each, so roughly 100 MB at most
+PLY_BITS = 8      # table keys are the zobrist key with the plies left in the low bits
+CHECK_PN = 1      # starting proof number for a checking move, mates are nearly always checks first
+QUIET_PN = 3      # and for any other attacking move
+
+
+class SearchLimit(Exception):
+    pass
+
+
+class MateSearch:
+    # table entries are keyed on zobrist key and plies left and hold
+    # [proof number, disproof number, plies to mate once proven, work done under it, children]
+    # children are kept for unsolved nodes since df-pn comes back to the same nodes a lot
+    # and generating the moves again is most of the cost. they are a flat list of
+    # move id, table key, starting proof number for each move, and the move is rebuilt from
+    # its id when it is played.
+    # max_entries bounds the table by counting each position and each kept child as one entry
+    def __init__(self, max_nodes=DEFAULT_MAX_NODES, time_limit=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.max_entries = max_entries
+        self.table = {}
+        self.size = 0  # entries used, positions plus kept children
+        self.nodes = 0
+        self.deadline = None
+        self.status = None
+        self.mate_in = None
+
+    def find_mate(self, gs, max_moves=5):
+        # returns the mating line as a list of moves (attacker and defender alternating)
+        # or None, status says why: "mate", "no mate", "node limit" or "time limit"
+        self.nodes = 0
+        self.mate_in = None
+        self.deadline = time.time() + self.time_limit if self.time_limit is not None else None
+
+        try:
+            for moves in range(1, max_moves + 1):
+                plies = 2 * moves - 1
+                pn = self._mid(gs, plies, INF - 1, INF - 1)[0]
+                if pn == 0:
+                    self.status = "mate"
+                    self.mate_in = moves
+                    return self._line(gs, plies)
+        except SearchLimit as e:
+            self.status = str(e)
+            return None
+
+        self.status = "no mate"
+        return None
+
+    def _mid(self, gs, plies_left, th_pn, th_dn):
+        # expand this node until its proof or disproof number reaches the thresholds
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise SearchLimit("node limit")
+        if self.deadline is not None and self.nodes % 256 == 0 and time.time() > self.deadline:
+            raise SearchLimit("time limit")
+
+        key = gs.zobrist_key << PLY_BITS | plies_left
+        or_node = plies_left % 2 == 1  # attacker moves on odd plies left
+        start_nodes = self.nodes
+
+        entry = self.table.get(key)
+        if entry is not None and entry[4] is not None:
+            children = entry[4]
+            start_nodes -= entry[3]  # work carries on from last time
+        else:
+            moves = gs.getValidMoves()
+            if not moves:
+                # mated defender is a proof, anything else (mated attacker, stalemate) isnt
+                entry = [0, INF, 0, 1, None] if (gs.checkmate and not or_node) else [INF, 0, 0, 1, None]
+                self._store(key, entry)
+                return entry[0], entry[1]
+            if plies_left == 0:
+                # defender still has moves with no plies left
+                self._store(key, [INF, 0, 0, 1, None])
+                return INF, 0
+            children = self._children(gs, moves, plies_left, or_node)
+
+        while True:
+            pn, dn, best, pn_2, dn_2, dist = self._collect(children, or_node)
+            if pn >= th_pn or dn >= th_dn:
+                break
+
+            child = self.table.get(children[best + 1])
+            c_pn, c_dn = (child[0], child[1]) if child else (children[best + 2], 1)
+            if or_node:
+                child_th_pn = min(th_pn, pn_2 + 1)
+                child_th_dn = min(INF - 1, th_dn - dn + c_dn)
+            else:
+                child_th_pn = min(INF - 1, th_pn - pn + c_pn)
+                child_th_dn = min(th_dn, dn_2 + 1)
+
+            gs.makeMove(self._move(gs, children[best]))
+            try:
+                self._mid(gs, plies_left - 1, child_th_pn, child_th_dn)
+            finally:
+                gs.undoMove()
+
+        solved = pn == 0 or dn == 0
+        self._store(key, [pn, dn, dist, self.nodes - start_nodes + 1, None if solved else children])
+        return pn, dn
+
+    def _children(self, gs, moves, plies_left, or_node):
+        # move id, table key and starting pn for each move, checks get a lower pn
+        # every child starts with a dn of 1
+        children = []
+        for move in moves:
+            gs.makeMove(move)
+            init_pn = 1
+            if or_node:
+                gives_check = gs.checkForPinsAndChecks()[0]
+                init_pn = CHECK_PN if gives_check else QUIET_PN
+            children += (move.move_id, gs.zobrist_key << PLY_BITS | plies_left - 1, init_pn)
+            gs.undoMove()
+        return children
+
+    def _move(self, gs, move_id):
+        # rebuilds a move from its id, there is no en passant and promotions are always to a queen
+        # so only castling needs telling apart
+        start_row, start_col = move_id // 1000, move_id // 100 % 10
+        end_row, end_col = move_id // 10 % 10, move_id % 10
+        is_castle = gs.board[start_row][start_col][1] == "K" and abs(end_col - start_col) == 2
+        return ChessEngine.Move((start_row, start_col), (end_row, end_col), gs.board, is_castle)
+
+    def _collect(self, children, or_node):
+        # proof and disproof numbers of the node from its children, the child to search next,
+        # the second best value for its threshold, and plies to mate if it is proven
+        pn = INF if or_node else 0
+        dn = 0 if or_node else INF
+        best = 0
+        best_val = INF
+        second_val = INF
+        dist = INF if or_node else 0
+
+        for i in range(0, len(children), 3):
+            entry = self.table.get(children[i + 1])
+            c_pn, c_dn = (entry[0], entry[1]) if entry else (children[i + 2], 1)
+
+            # OR nodes go for the smallest proof number, AND nodes the smallest disproof number
+            val = c_pn if or_node else c_dn
+            if val < best_val:
+                second_val = best_val
+                best_val = val
+                best = i
+            elif val < second_val:
+                second_val = val
+
+            if or_node:
+                pn = min(pn, c_pn)
+                dn = min(INF, dn + c_dn)
+                if c_pn == 0:
+                    dist = min(dist, entry[2] + 1)
+            else:
+                pn = min(INF, pn + c_pn)
+                dn = min(dn, c_dn)
+                if c_pn == 0:
+                    dist = max(dist, entry[2] + 1)
+
+        if pn != 0:
+            dist = 0
+        if or_node:
+            return pn, dn, best, second_val, 0, dist
+        return pn, dn, best, 0, second_val, dist
+
+    def _store(self, key, entry):
+        # evicting first so the entry just worked out is never the one thrown away
+        old = self.table.pop(key, None)
+        if old is not None:
+            self.size -= _entry_size(old)
+        size = _entry_size(entry)
+        if self.size + size > self.max_entries:
+            self._evict()
+        self.table[key] = entry
+        self.size += size
+
+    def _evict(self):
+        # keep the entries that took the most work to build, up to half the budget,
+        # then as many of the remaining proofs as still fit
+        entries = sorted(self.table.items(), key=lambda item: item[1][3], reverse=True)
+        self.table = {}
+        self.size = 0
+        for k, e in entries:
+            size = _entry_size(e)
+            if self.size + size <= self.max_entries // 2 or (e[0] == 0 and self.size + size <= self.max_entries):
+                self.table[k] = e
+                self.size += size
+
+    def _line(self, gs, plies):
+        # attacker takes the quickest mate, defender the reply that lasts longest
+        line = []
+        plies_left = plies
+        while plies_left > 0:
+            moves = gs.getValidMoves()
+            or_node = plies_left % 2 == 1
+            best = None
+            best_dist = None
+            for move in moves:
+                gs.makeMove(move)
+                entry = self.table.get(gs.zobrist_key << PLY_BITS | plies_left - 1)
+                gs.undoMove()
+                if entry is None or entry[0] != 0:
+                    continue
+                if best is None or (entry[2] < best_dist if or_node else entry[2] > best_dist):
+                    best = move
+                    best_dist = entry[2]
+            if best is None:
+                break  # part of the proof was evicted, the line stops here
+            line.append(best)
+            gs.makeMove(best)
+            plies_left -= 1
+            if best_dist == 0:
+                break
+        for _ in line:
+            gs.undoMove()
+        return line
+
+
+def _entry_size(entry):
+    # one for the position and one for each kept child
+    return 1 if entry[4] is None else 1 + len(entry[4]) // 3
+
+
+def find_mate(gs, max_moves=5, max_nodes=DEFAULT_MAX_NODES, time_limit=None):
+    # returns (line, mate in how many moves) or (None, None)
+    search = MateSearch(max_nodes, time_limit)
+    line = search.find_mate(gs, max_moves)
+    return line, search.mate_in
@@ -0,0 +1,132 @@
+# Plays the engine against itself to make training data for texel_tuner.py
+# games run on a pool of processes and every position is appended to a binary file
+#
+# each record is RECORD_SIZE bytes:
+#   32 bytes  board, one 4 bit piece code per square, square 0 (a8) in the low nibble of byte 0
+#   1 byte    side to move, 1 = white
+#   1 byte    game result from white's side, 0 = loss, 1 = draw, 2 = win
+# records are fixed size with no header so files can be appended to and memory mapped
+
+import argparse
+import multiprocessing
+import random
+import time
+
+import ChessEngine
+
+PIECE_CODES = ChessEngine.PIECE_CODES
+CODE_OF = ChessEngine.CODE_OF
+RECORD_SIZE = 34
+
+BLACK_WIN = 0
+DRAW = 1
+WHITE_WIN = 2
+
+
+def pack_position(gs):
+    # board and side to move, the result byte is filled in when the game ends
+    codes = [CODE_OF[piece] for row in gs.board for piece in row]
+    packed = bytearray(33)
+    for i in range(32):
+        packed[i] = codes[2 * i] | (codes[2 * i + 1] << 4)
+    packed[32] = 1 if gs.white_to_move else 0
+    return bytes(packed)
+
+
+def unpack_position(record):
+    # back to a GameState, mainly for checking files by hand
+    gs = ChessEngine.GameState()
+    for i in range(64):
+        byte = record[i // 2]
+        code = byte & 15 if i % 2 == 0 else byte >> 4
+        piece = PIECE_CODES[code]
+        gs.board[i // 8][i % 8] = piece
+        if piece == "wK":
+            gs.white_king_location = (i // 8, i % 8)
+        elif piece == "bK":
+            gs.black_king_location = (i // 8, i % 8)
+    gs.white_to_move = record[32] == 1
+    gs.current_castling_rights = ChessEngine.CastleRights(False, False, False, False)
+    gs.castle_rights_log = [ChessEngine.CastleRights(False, False, False, False)]
+    gs.pawn_key = gs.computePawnKey()
+    gs.zobrist_key = gs.computeZobristKey()
+    return gs, record[33]
+
+
+def only_kings_left(gs):
+    for row in gs.board:
+        for piece in row:
+            if piece != "--" and piece[1] != "K":
+                return False
+    return True
+
+
+def play_game(seed, depth=2, random_plies=8, max_plies=200):
+    # a few random moves first so games dont all repeat the same opening
+    # returns every position after the random opening with the result filled in
+    rng = random.Random(seed)
+    gs = ChessEngine.GameState()
+    session = ChessEngine.EngineSession(gs)  # plays both sides, reusing its tables between moves
+    positions = []
+    result = DRAW
+
+    for ply in range(max_plies):
+        moves = gs.getValidMoves()
+        if not moves:
+            if gs.checkmate:
+                result = BLACK_WIN if gs.white_to_move else WHITE_WIN
+            break
+        if only_kings_left(gs):
+            break
+
+        if ply < random_plies:
+            move = rng.choice(moves)
+        else:
+            positions.append(pack_position(gs))
+            move = session.choose_move(depth)
+        gs.makeMove(move)
+    # running out of plies counts as a draw
+
+    return b"".join(p + bytes([result]) for p in positions)
+
+
+def _play_game_job(args):
+    return play_game(*args)
+
+
+def generate(path, games, workers=None, depth=2, random_plies=8, max_plies=200, seed=0, chunk_games=16):
+    # results stream back as games finish and are written in chunks of chunk_games,
+    # so a long run can be stopped at any point and the file is still usable
+    jobs = ((seed + i, depth, random_plies, max_plies) for i in range(games))
+    written = 0
+    buffered = []
+    start = time.time()
+
+    with open(path, "ab") as f, multiprocessing.Pool(workers) as pool:
+        for done, blob in enumerate(pool.imap_unordered(_play_game_job, jobs), 1):
+            buffered.append(blob)
+            if len(buffered) >= chunk_games or done == games:
+                chunk = b"".join(buffered)
+                f.write(chunk)
+                f.flush()
+                written += len(chunk) // RECORD_SIZE
+                buffered = []
+                print("{}/{} games, {} positions, {:.1f}s".format(done, games, written, time.time() - start))
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate self-play positions for tuning")
+    parser.add_argument("path", help="file to append records to")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--random-plies", type=int, default=8)
+    parser.add_argument("--max-plies", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0, help="change this when appending more games to a file")
+    args = parser.parse_args()
+    generate(args.path, args.games, args.workers, args.depth, args.random_plies, args.max_plies, args.seed)
+
+
+if __name__ == "__main__":
+    main()
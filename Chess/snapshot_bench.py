@@ -0,0 +1,76 @@
+# Compares handing a GameState to another process by pickling it against the binary snapshot
+# pickling grows with the move history, the snapshot is always SNAPSHOT_SIZE bytes
+#   python snapshot_bench.py
+
+import copy
+import multiprocessing
+import pickle
+import random
+import timeit
+
+import ChessEngine
+
+
+def position_after(plies, seed=1):
+    # random game of the given length so the move and castling logs fill up
+    rng = random.Random(seed)
+    gs = ChessEngine.GameState()
+    while len(gs.move_log) < plies:
+        moves = gs.getValidMoves()
+        if not moves:
+            gs = ChessEngine.GameState()
+            continue
+        gs.makeMove(rng.choice(moves))
+    return gs
+
+
+def per_call_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def echo(conn):
+    # sends back whatever it gets until it gets None
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            return
+        conn.send(msg)
+
+
+def pipe_round_trip_us(conn, obj, number):
+    def round_trip():
+        conn.send(obj)
+        conn.recv()
+    return per_call_us(round_trip, number)
+
+
+def main():
+    parent, child = multiprocessing.Pipe()
+    worker = multiprocessing.Process(target=echo, args=(child,))
+    worker.start()
+
+    print("{:>6} {:>10} {:>10} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+        "plies", "pickle B", "snap B", "deepcopy us", "clone us",
+        "pickle us", "snap us", "pipe pkl us", "pipe snap us"))
+    for plies in (0, 40, 120, 300):
+        gs = position_after(plies)
+        data = gs.to_bytes()
+        pickled = pickle.dumps(gs, pickle.HIGHEST_PROTOCOL)
+
+        deepcopy_us = per_call_us(lambda: copy.deepcopy(gs), 50)
+        clone_us = per_call_us(gs.clone, 2000)
+        pickle_us = per_call_us(lambda: pickle.loads(pickle.dumps(gs, pickle.HIGHEST_PROTOCOL)), 200)
+        snap_us = per_call_us(lambda: ChessEngine.GameState.from_bytes(gs.to_bytes()), 2000)
+        pipe_pickle_us = pipe_round_trip_us(parent, gs, 100)
+        pipe_snap_us = pipe_round_trip_us(parent, data, 500)
+
+        print("{:>6} {:>10} {:>10} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+            plies, len(pickled), len(data), deepcopy_us, clone_us,
+            pickle_us, snap_us, pipe_pickle_us, pipe_snap_us))
+
+    parent.send(None)
+    worker.join()
+
+
+if __name__ == "__main__":
+    main()
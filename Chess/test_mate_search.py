@@ -0,0 +1,54 @@
+import ChessEngine
+import bench
+import mate_search
+
+
+def test_short_mates():
+    for name, fen, mate_in in bench.MATE_POSITIONS:
+        if mate_in > 2:
+            continue
+        gs = ChessEngine.GameState()
+        gs.loadFEN(fen)
+        before = gs.to_bytes()
+        search = mate_search.MateSearch()
+        line = search.find_mate(gs, mate_in)
+        assert search.status == "mate", name
+        assert search.mate_in == mate_in, name
+        assert len(line) == 2 * mate_in - 1, name
+        assert gs.to_bytes() == before  # the search leaves the position as it found it
+
+        # the line has to be legal all the way and end in checkmate
+        for move in line:
+            assert move in gs.getValidMoves(), name
+            gs.makeMove(move)
+        assert gs.getValidMoves() == [] and gs.checkmate, name
+
+
+def test_no_mate():
+    # rook and king against king, a8 check lets the king out to d7, e7 or f7
+    gs = ChessEngine.GameState()
+    gs.loadFEN("4k3/8/8/8/8/8/8/R3K3 w - - 0 1")
+    search = mate_search.MateSearch()
+    assert search.find_mate(gs, 1) is None
+    assert search.status == "no mate"
+    assert search.mate_in is None
+
+
+def test_limits():
+    # rook_roller needs a few hundred nodes, more than a zero time limit allows
+    gs = ChessEngine.GameState()
+    gs.loadFEN("8/R7/K7/8/8/7k/8/4R3 w - - 0 1")
+    search = mate_search.MateSearch(time_limit=0)
+    assert search.find_mate(gs, 3) is None
+    assert search.status == "time limit"
+
+    search = mate_search.MateSearch(max_nodes=100)
+    assert search.find_mate(gs, 3) is None
+    assert search.status == "node limit"
+
+
+if __name__ == "__main__":
+    test_short_mates()
+    test_no_mate()
+    test_limits()
+    print("all mate search checks passed")
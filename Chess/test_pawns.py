@@ -0,0 +1,78 @@
+import ChessEngine
+
+
+def pawn_board(white, black):
+    # board with only the given pawns, squares like "e4"
+    board = [["--"] * 8 for _ in range(8)]
+    for color, squares in (("w", white), ("b", black)):
+        for square in squares:
+            board[8 - int(square[1])]["abcdefgh".index(square[0])] = color + "P"
+    return board
+
+
+def flip_colours(board):
+    # board turned round with white and black swapped
+    flipped = [["--"] * 8 for _ in range(8)]
+    for r in range(8):
+        for c in range(8):
+            piece = board[r][c]
+            if piece != "--":
+                flipped[7 - r][c] = ("b" if piece[0] == "w" else "w") + piece[1]
+    return flipped
+
+
+def test_doubled_pawns():
+    # white d2 e2 e3 against black d7 e7: nothing passed, isolated or backward,
+    # only the doubled e pawn -10
+    board = pawn_board(["d2", "e2", "e3"], ["d7", "e7"])
+    assert ChessEngine.evaluate_pawns(board) == -10
+
+
+def test_isolated_pawn():
+    # white a2 has no pawn on the b file -15, it isn't passed because of a7 and b7
+    board = pawn_board(["a2"], ["a7", "b7"])
+    assert ChessEngine.evaluate_pawns(board) == -15
+
+
+def test_passed_pawns():
+    # white d5 e5 with no black pawns, both passed 3 ranks up +20 each
+    board = pawn_board(["d5", "e5"], [])
+    assert ChessEngine.evaluate_pawns(board) == 40
+
+
+def test_backward_pawn():
+    # white d3 can't be supported by e4 and c5 covers d4 -8,
+    # e4 is passed 2 ranks up +10, black c5 is isolated so +15 for white
+    board = pawn_board(["d3", "e4"], ["c5"])
+    assert ChessEngine.evaluate_pawns(board) == 17
+
+
+def test_black_mirror():
+    # the backward pawn case with colours swapped
+    board = pawn_board(["c4"], ["d6", "e5"])
+    assert ChessEngine.evaluate_pawns(board) == -17
+
+    for board in (pawn_board(["d2", "e2", "e3"], ["d7", "e7"]), pawn_board(["a2"], ["a7", "b7"]),
+                  pawn_board(["d5", "e5"], []), pawn_board(["d3", "e4"], ["c5"])):
+        assert ChessEngine.evaluate_pawns(flip_colours(board)) == -ChessEngine.evaluate_pawns(board)
+
+
+def test_pawn_hash_hit_rate():
+    # pawns rarely move inside a search so nearly every probe should hit
+    gs = ChessEngine.GameState()
+    gs.loadFEN("r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 b - - 0 10")
+    ChessEngine.pawn_hash.clear()
+    ChessEngine.pawn_hash_probes = 0
+    ChessEngine.pawn_hash_hits = 0
+    ChessEngine.choose_best_move(gs, 3)
+    assert ChessEngine.pawn_hash_hits / ChessEngine.pawn_hash_probes > 0.9
+
+
+if __name__ == "__main__":
+    test_doubled_pawns()
+    test_isolated_pawn()
+    test_passed_pawns()
+    test_backward_pawn()
+    test_black_mirror()
+    test_pawn_hash_hit_rate()
+    print("all pawn structure checks passed")
@@ -1,23 +1,122 @@
+import random
+
 import ChessEngine
 
-gs = ChessEngine.GameState()
 
-# clear the board
-for r in range(8):
-    for c in range(8):
-        gs.board[r][c] = "--"
+def empty_board(white_king=(7, 4), black_king=(0, 4)):
+    # just the two kings, by default on e1 and e8 so their scores cancel out
+    gs = ChessEngine.GameState()
+    for r in range(8):
+        for c in range(8):
+            gs.board[r][c] = "--"
+    gs.board[white_king[0]][white_king[1]] = "wK"
+    gs.board[black_king[0]][black_king[1]] = "bK"
+    gs.white_king_location = white_king
+    gs.black_king_location = black_king
+    gs.pawn_key = gs.computePawnKey()
+    return gs
+
+
+def test_start_position_is_even():
+    gs = ChessEngine.GameState()
+    assert ChessEngine.evaluate_board(gs) == 0
+
+
+def test_knight_squares():
+    gs = empty_board()
+
+    # knight on f3 = 320 + 10
+    gs.board[5][5] = "wN"
+    assert ChessEngine.evaluate_board(gs) == 330
+
+    # move knight to h3 = 320 - 30
+    gs.board[5][5] = "--"
+    gs.board[5][7] = "wN"
+    assert ChessEngine.evaluate_board(gs) == 290
+
+
+def test_black_pieces_are_mirrored():
+    gs = empty_board()
+
+    # black knight on f6 is the same square as a white one on f3
+    gs.board[2][5] = "bN"
+    assert ChessEngine.evaluate_board(gs) == -330
+
+    # black rook on its 7th rank = -(500 + 10)
+    gs.board[2][5] = "--"
+    gs.board[6][3] = "bR"
+    assert ChessEngine.evaluate_board(gs) == -510
+
+
+def test_endgame_king_table():
+    # no pieces left so phase is 0 and only the endgame tables count
+    # white king d4 = 40, black king e8 = -30 for black so +30 for white
+    gs = empty_board(white_king=(4, 3))
+    assert ChessEngine.evaluate_board(gs) == 70
+
+
+def test_tapered_eval():
+    # adding a queen on d1 gives phase 4 out of 24
+    # middlegame: queen 900 - 5, king d4 -40, king e8 0 -> 855
+    # endgame:    queen 900 - 5, king d4 40, king e8 +30 -> 965
+    gs = empty_board(white_king=(4, 3))
+    gs.board[7][3] = "wQ"
+    assert ChessEngine.evaluate_board(gs) == int((855 * 4 + 965 * 20) / 24)
+
+
+def test_pawn_structure_added():
+    # lone white pawn on e4 in the endgame: 100 + 20 from the table,
+    # isolated -15 and passed having moved up 2 ranks +10
+    gs = empty_board()
+    gs.board[4][4] = "wP"
+    gs.pawn_key = gs.computePawnKey()
+    assert ChessEngine.evaluate_board(gs) == 115
+
+
+def flip_colours(gs):
+    # same position with the board turned round and white and black swapped
+    flipped = empty_board()
+    for r in range(8):
+        for c in range(8):
+            piece = gs.board[r][c]
+            if piece != "--":
+                piece = ("b" if piece[0] == "w" else "w") + piece[1]
+            flipped.board[7 - r][c] = piece
+    r, c = gs.black_king_location
+    flipped.white_king_location = (7 - r, c)
+    r, c = gs.white_king_location
+    flipped.black_king_location = (7 - r, c)
+    flipped.white_to_move = not gs.white_to_move
+    flipped.pawn_key = flipped.computePawnKey()
+    return flipped
+
+
+def test_colour_flip_is_symmetric():
+    # phase 4 leaves a remainder when the taper is divided by 24, which used to round towards black
+    gs = empty_board(white_king=(4, 3))
+    gs.board[7][3] = "wQ"
+    gs.board[3][6] = "bP"
+    gs.pawn_key = gs.computePawnKey()
+    assert ChessEngine.evaluate_board(gs) == -ChessEngine.evaluate_board(flip_colours(gs))
 
-# just kings and one knight
-gs.board[7][4] = "wK"
-gs.board[0][4] = "bK"
-gs.white_king_location = (7, 4)
-gs.black_king_location = (0, 4)
+    # and every position along a few random games
+    rng = random.Random(3)
+    for _ in range(4):
+        gs = ChessEngine.GameState()
+        for _ in range(60):
+            moves = gs.getValidMoves()
+            if not moves:
+                break
+            assert ChessEngine.evaluate_board(gs) == -ChessEngine.evaluate_board(flip_colours(gs))
+            gs.makeMove(rng.choice(moves))
 
-# knight on f3
-gs.board[5][5] = "wN"
-print("Knight on f3:", ChessEngine.evaluate_board(gs))
 
-# move knight to h3
-gs.board[5][5] = "--"
-gs.board[5][7] = "wN"
-print("Knight on h3:", ChessEngine.evaluate_board(gs))
\ No newline at end of file
+if __name__ == "__main__":
+    test_start_position_is_even()
+    test_knight_squares()
+    test_black_pieces_are_mirrored()
+    test_endgame_king_table()
+    test_tapered_eval()
+    test_pawn_structure_added()
+    test_colour_flip_is_symmetric()
+    print("all piece square table checks passed")
@@ -0,0 +1,72 @@
+import itertools
+import random
+
+import ChessEngine
+
+
+def test_same_moves_as_minimax():
+    # the tables only make the search faster, it should still pick the moves plain minimax does
+    for depth, plies in ((2, 10), (3, 6)):
+        gs = ChessEngine.GameState()
+        session = ChessEngine.EngineSession(gs)
+        for _ in range(plies):
+            move = session.choose_move(depth)
+            assert move == ChessEngine.choose_best_move(gs, depth)
+            gs.makeMove(move)
+
+
+def test_stopped_root_is_a_bound():
+    # stop fires after a few root moves of the deepest iteration
+    for fen in ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"):
+        gs = ChessEngine.GameState()
+        gs.loadFEN(fen)
+        session = ChessEngine.EngineSession(gs)
+        calls = itertools.count()
+        move = session.choose_move(3, stop=lambda: next(calls) >= 3)
+        assert move in gs.getValidMoves()
+        entry = session.tt[gs.zobrist_key]
+        assert entry[2] == (ChessEngine.TT_LOWER if gs.white_to_move else ChessEngine.TT_UPPER)
+
+        # a finished search of the same position is exact
+        session = ChessEngine.EngineSession(gs)
+        session.choose_move(3)
+        assert session.tt[gs.zobrist_key][2] == ChessEngine.TT_EXACT
+
+
+def test_second_search_starts_deeper():
+    # the root is already searched to depth 3 so the next search starts there instead of depth 1
+    gs = ChessEngine.GameState()
+    session = ChessEngine.EngineSession(gs)
+    first = session.choose_move(3)
+    first_nodes = session.nodes
+    assert session.choose_move(3) == first
+    assert session.nodes < first_nodes
+
+
+def test_evict_drops_old_entries():
+    session = ChessEngine.EngineSession(tt_size=100)
+    session.age = 5
+    rng = random.Random(1)
+    for key in range(40):
+        age = 5 - key % 4  # ages 5, 4, 3 and 2
+        session.tt[key] = [rng.randint(1, 4), 0, ChessEngine.TT_EXACT, 0, age]
+    session._evict()
+    # TT_MAX_AGE is 2 so entries from this search and the one before stay
+    assert session.tt
+    assert all(e[4] > session.age - ChessEngine.TT_MAX_AGE for e in session.tt.values())
+    assert len(session.tt) == 20
+
+    # still too full after that, so only deeper entries from the current search are kept
+    session.tt = {key: [key % 3, 0, ChessEngine.TT_EXACT, 0, 5 - key % 2] for key in range(90)}
+    session._evict()
+    assert session.tt
+    assert all(e[4] == session.age and e[0] > 1 for e in session.tt.values())
+
+
+if __name__ == "__main__":
+    test_same_moves_as_minimax()
+    test_stopped_root_is_a_bound()
+    test_second_search_starts_deeper()
+    test_evict_drops_old_entries()
+    print("all engine session checks passed")
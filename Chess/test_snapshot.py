@@ -0,0 +1,87 @@
+import random
+
+import ChessEngine
+
+
+def move_names(gs):
+    return sorted(m.getChessNotation() for m in gs.getValidMoves())
+
+
+def random_positions(seed, games=4, plies=80):
+    # yields the game state after every move of a few random games, using the same object throughout
+    rng = random.Random(seed)
+    for _ in range(games):
+        gs = ChessEngine.GameState()
+        yield gs
+        for _ in range(plies):
+            moves = gs.getValidMoves()
+            if not moves:
+                break
+            gs.makeMove(rng.choice(moves))
+            yield gs
+
+
+def test_incremental_keys_match_recomputed():
+    for gs in random_positions(1):
+        assert gs.zobrist_key == gs.computeZobristKey()
+        assert gs.pawn_key == gs.computePawnKey()
+
+
+def test_keys_restored_by_undo():
+    rng = random.Random(2)
+    gs = ChessEngine.GameState()
+    start = (gs.zobrist_key, gs.pawn_key)
+    for _ in range(60):
+        moves = gs.getValidMoves()
+        if not moves:
+            break
+        gs.makeMove(rng.choice(moves))
+    while gs.move_log:
+        gs.undoMove()
+        assert gs.zobrist_key == gs.computeZobristKey()
+        assert gs.pawn_key == gs.computePawnKey()
+    assert (gs.zobrist_key, gs.pawn_key) == start
+
+
+def test_bytes_round_trip():
+    for gs in random_positions(3):
+        data = gs.to_bytes()
+        assert len(data) == ChessEngine.SNAPSHOT_SIZE
+        copy = ChessEngine.GameState.from_bytes(data)
+        assert copy.to_bytes() == data
+        assert copy.board == gs.board
+        assert copy.getFEN() == gs.getFEN()
+        assert move_names(copy) == move_names(gs)
+
+
+def test_clone_is_independent():
+    for gs in random_positions(4, games=2):
+        copy = gs.clone()
+        assert copy.to_bytes() == gs.to_bytes()
+        assert copy.move_log == []
+
+        before = gs.to_bytes()
+        moves = copy.getValidMoves()
+        if moves:
+            copy.makeMove(moves[0])
+            assert copy.zobrist_key == copy.computeZobristKey()
+        assert gs.to_bytes() == before
+
+
+def test_fen_round_trip():
+    for gs in random_positions(5):
+        fen = gs.getFEN()
+        copy = ChessEngine.GameState()
+        copy.loadFEN(fen)
+        assert copy.getFEN() == fen
+        # the keys are worked out from scratch here so they have to match the incremental ones
+        assert copy.to_bytes() == gs.to_bytes()
+
+
+if __name__ == "__main__":
+    test_incremental_keys_match_recomputed()
+    test_keys_restored_by_undo()
+    test_bytes_round_trip()
+    test_clone_is_independent()
+    test_fen_round_trip()
+    print("all snapshot checks passed")
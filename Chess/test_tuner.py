@@ -0,0 +1,94 @@
+import os
+import random
+import tempfile
+
+import ChessEngine
+import selfplay
+import texel_tuner
+
+
+def random_records(seed, games=4, plies=60):
+    # records from random games, quicker than real self-play and just as good for checking the format
+    rng = random.Random(seed)
+    records = []
+    for _ in range(games):
+        gs = ChessEngine.GameState()
+        result = rng.choice((selfplay.BLACK_WIN, selfplay.DRAW, selfplay.WHITE_WIN))
+        for _ in range(plies):
+            moves = gs.getValidMoves()
+            if not moves:
+                break
+            records.append(selfplay.pack_position(gs) + bytes([result]))
+            gs.makeMove(rng.choice(moves))
+    return records
+
+
+def write_file(data):
+    f = tempfile.NamedTemporaryFile(suffix=".bin", delete=False)
+    f.write(data)
+    f.close()
+    return f.name
+
+
+def test_record_round_trip():
+    rng = random.Random(1)
+    gs = ChessEngine.GameState()
+    for _ in range(60):
+        moves = gs.getValidMoves()
+        if not moves:
+            break
+        record = selfplay.pack_position(gs) + bytes([selfplay.WHITE_WIN])
+        assert len(record) == selfplay.RECORD_SIZE
+        copy, result = selfplay.unpack_position(record)
+        assert copy.board == gs.board
+        assert copy.white_to_move == gs.white_to_move
+        assert copy.white_king_location == gs.white_king_location
+        assert copy.black_king_location == gs.black_king_location
+        assert copy.pawn_key == gs.pawn_key
+        assert result == selfplay.WHITE_WIN
+        gs.makeMove(rng.choice(moves))
+
+
+def test_tuner_matches_evaluate_board():
+    # with the engine's own weights the tuner has to predict exactly what evaluate_board says,
+    # pawn structure included. the tuner doesn't round so allow anything under a point
+    records = random_records(2)
+    path = write_file(b"".join(records))
+    try:
+        data = texel_tuner.load_records(path)
+        assert len(data) == len(records)
+        index, sign, phase, target = texel_tuner.chunk_features(data)
+        pawns = texel_tuner.pawn_scores(data, chunk=50)
+        evals = texel_tuner.evaluate_chunk(texel_tuner.starting_weights(), index, sign, phase, pawns)
+        for record, value in zip(records, evals):
+            gs, _ = selfplay.unpack_position(record)
+            assert abs(ChessEngine.evaluate_board(gs) - value) < 1
+        del data
+    finally:
+        os.remove(path)
+
+
+def test_partial_and_empty_files():
+    # a run stopped part way through a write leaves a partial record, which is skipped
+    records = random_records(3, games=1, plies=10)
+    path = write_file(b"".join(records) + records[0][:5])
+    try:
+        data = texel_tuner.load_records(path)
+        assert len(data) == len(records)
+        assert bytes(data[-1].tobytes()) == records[-1]
+        del data
+    finally:
+        os.remove(path)
+
+    path = write_file(b"")
+    try:
+        assert len(texel_tuner.load_records(path)) == 0
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    test_record_round_trip()
+    test_tuner_matches_evaluate_board()
+    test_partial_and_empty_files()
+    print("all self-play record and tuner checks passed")
@@ -0,0 +1,185 @@
+# Texel tuning of the piece-square tables from self-play data made by selfplay.py
+# the record file is memory mapped and read in chunks so it never all has to be in memory
+#
+# the tuned weights are what evaluate_board looks up: material plus table value for every
+# piece type and square, for both the middlegame and endgame tables, from white's side.
+# black pieces share the same weights mirrored. the pawn structure terms are not tuned but are
+# still added to every prediction, so the tables dont try to make up for them
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+import ChessEngine
+import selfplay
+
+RECORD_DTYPE = np.dtype([("board", np.uint8, 32), ("side", np.uint8), ("result", np.uint8)])
+PIECE_TYPES = "PNBRQK"
+
+# per piece code lookups, code 0 is an empty square
+CODE_TYPE = np.array([0] + [PIECE_TYPES.index(p[1]) for p in selfplay.PIECE_CODES[1:]])
+CODE_SIGN = np.array([0] + [1 if p[0] == "w" else -1 for p in selfplay.PIECE_CODES[1:]])
+CODE_PHASE = np.array([0] + [ChessEngine.PHASE_WEIGHT[p[1]] for p in selfplay.PIECE_CODES[1:]])
+CODE_BLACK = CODE_SIGN < 0
+SQUARES = np.arange(64)
+
+DEFAULT_K = np.log(10) / 400  # win chance of 1 / (1 + 10^(-eval/400))
+CHUNK = 1 << 16
+
+
+def load_records(path):
+    # a run stopped in the middle of a write can leave part of a record at the end, that is left out
+    count = os.path.getsize(path) // selfplay.RECORD_SIZE
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)  # an empty file can't be memory mapped
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+
+def starting_weights():
+    # shape (2, 6, 64), [0] middlegame and [1] endgame, from the engine's current tables
+    weights = np.zeros((2, 6, 64))
+    for t, ptype in enumerate(PIECE_TYPES):
+        weights[0, t] = ChessEngine.MG_TABLES["w" + ptype]
+        weights[1, t] = ChessEngine.EG_TABLES["w" + ptype]
+    return weights
+
+
+def unpack_boards(records):
+    # one piece code per square, shape (records, 64)
+    packed = records["board"]
+    boards = np.empty((len(records), 64), dtype=np.uint8)
+    boards[:, 0::2] = packed & 15
+    boards[:, 1::2] = packed >> 4
+    return boards
+
+
+def pawn_scores(records, chunk=CHUNK):
+    # evaluate_pawns for every record, worked out once since tuning never changes it
+    # positions from the same game mostly share a pawn structure so those are cached
+    scores = np.empty(len(records))
+    cache = {}
+    pawn_codes = [selfplay.CODE_OF["wP"], selfplay.CODE_OF["bP"]]
+    for start in range(0, len(records), chunk):
+        boards = unpack_boards(records[start:start + chunk])
+        pawns = np.where(np.isin(boards, pawn_codes), boards, 0)
+        for i, codes in enumerate(pawns):
+            key = codes.tobytes()
+            score = cache.get(key)
+            if score is None:
+                board = [[selfplay.PIECE_CODES[code] for code in codes[r * 8:r * 8 + 8]] for r in range(8)]
+                score = cache[key] = ChessEngine.evaluate_pawns(board)
+            scores[start + i] = score
+    return scores
+
+
+def chunk_features(records):
+    # turns a chunk of records into flat weight indices, signs and phase for every square
+    boards = unpack_boards(records)
+
+    # black pieces read the white table upside down
+    squares = np.where(CODE_BLACK[boards], SQUARES ^ 56, SQUARES)
+    index = CODE_TYPE[boards] * 64 + squares
+    sign = CODE_SIGN[boards].astype(np.float64)
+    phase = np.minimum(CODE_PHASE[boards].sum(axis=1), ChessEngine.MAX_PHASE)
+    target = records["result"] / 2.0
+    return index, sign, phase, target
+
+
+def evaluate_chunk(weights, index, sign, phase, pawns):
+    # same sum as evaluate_board but for a whole chunk of positions at once
+    # pawns is the fixed pawn structure score of each position
+    mg = (weights[0].ravel()[index] * sign).sum(axis=1)
+    eg = (weights[1].ravel()[index] * sign).sum(axis=1)
+    return (mg * phase + eg * (ChessEngine.MAX_PHASE - phase)) / ChessEngine.MAX_PHASE + pawns
+
+
+def loss_and_gradient(weights, records, pawns, k=DEFAULT_K, chunk=CHUNK):
+    # mean squared error between the predicted win chance and the game result
+    # pawns is pawn_scores(records)
+    total = 0.0
+    grad = np.zeros_like(weights)
+    n = len(records)
+
+    for start in range(0, n, chunk):
+        index, sign, phase, target = chunk_features(records[start:start + chunk])
+        evals = evaluate_chunk(weights, index, sign, phase, pawns[start:start + chunk])
+        predicted = 1 / (1 + np.exp(-k * evals))
+        error = predicted - target
+        total += (error * error).sum()
+
+        # d loss / d eval for each position, then spread over the squares it used
+        d_eval = 2 * error * predicted * (1 - predicted) * k
+        mg_part = (d_eval * phase / ChessEngine.MAX_PHASE)[:, None] * sign
+        eg_part = (d_eval * (ChessEngine.MAX_PHASE - phase) / ChessEngine.MAX_PHASE)[:, None] * sign
+        flat = index.ravel()
+        grad[0] += np.bincount(flat, weights=mg_part.ravel(), minlength=6 * 64).reshape(6, 64)
+        grad[1] += np.bincount(flat, weights=eg_part.ravel(), minlength=6 * 64).reshape(6, 64)
+
+    return total / n, grad / n
+
+
+def tune(records, weights=None, epochs=200, rate=2.0, k=DEFAULT_K, chunk=CHUNK):
+    # plain Adam steps over the whole file each epoch
+    if weights is None:
+        weights = starting_weights()
+    pawns = pawn_scores(records, chunk)
+    m = np.zeros_like(weights)
+    v = np.zeros_like(weights)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    for epoch in range(1, epochs + 1):
+        loss, grad = loss_and_gradient(weights, records, pawns, k, chunk)
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad * grad
+        m_hat = m / (1 - beta1 ** epoch)
+        v_hat = v / (1 - beta2 ** epoch)
+        weights = weights - rate * m_hat / (np.sqrt(v_hat) + eps)
+        if epoch == 1 or epoch % 10 == 0:
+            print("epoch {} loss {:.6f}".format(epoch, loss))
+    return weights
+
+
+def split_weights(weights):
+    # back into PIECE_VALUE and 8x8 tables the same shape as the ones in ChessEngine
+    # material is the average over the squares the piece can stand on
+    piece_value = {}
+    tables = {"MG": {}, "EG": {}}
+    for t, ptype in enumerate(PIECE_TYPES):
+        squares = weights[:, t, 8:56] if ptype == "P" else weights[:, t]
+        value = 0 if ptype == "K" else int(round(squares.mean()))
+        piece_value[ptype] = value
+        for phase_index, name in enumerate(("MG", "EG")):
+            table = np.rint(weights[phase_index, t] - value).astype(int).reshape(8, 8)
+            if ptype == "P":
+                table[0] = 0
+                table[7] = 0
+            tables[name][ptype] = table.tolist()
+    return piece_value, tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="texel tune the evaluation on self-play data")
+    parser.add_argument("path", help="record file written by selfplay.py")
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=2.0)
+    parser.add_argument("--k", type=float, default=DEFAULT_K)
+    parser.add_argument("--out", default="tuned_weights.json")
+    args = parser.parse_args()
+
+    records = load_records(args.path)
+    print("{} positions".format(len(records)))
+    if len(records) == 0:
+        return
+    weights = tune(records, epochs=args.epochs, rate=args.rate, k=args.k)
+    piece_value, tables = split_weights(weights)
+
+    with open(args.out, "w") as f:
+        json.dump({"PIECE_VALUE": piece_value, "MG": tables["MG"], "EG": tables["EG"]}, f, indent=1)
+    print("PIECE_VALUE =", piece_value)
+    print("written to", args.out)
+
+
+if __name__ == "__main__":
+    main()